@@ -1,8 +1,7 @@
 import torch
 from torch import nn
-from torch.utils.data import DataLoader
 from jepa.utils import set_seed
-from jepa.dataset import load_cifar, load_mnist
+from jepa.dataset import load_cifar, load_mnist, make_loader
 from jepa.model.autoencoder import AutoEncoder, AutoencoderCriterion
 from jepa.trainer.ae_trainer import AutoencoderTrainer
 from jepa.sam import SAM
@@ -52,8 +51,8 @@ train_dataset, train_metadata = load_dataset(train=True, log_to_wandb=False, pro
 test_dataset, test_metadata = load_dataset(train=False, log_to_wandb=False, project=wandb_project, root=root, jepa=False, shuffle=seed, num_samples=test_size)
 train_metadata["use_as"] = "train"
 test_metadata["use_as"] = "test"
-train_loader = DataLoader(train_dataset, batch_size=batch_size)
-test_loader = DataLoader(test_dataset, batch_size=test_size)  # be mindful of the batch size
+train_loader = make_loader(train_dataset, batch_size=batch_size, shuffle=False, device=device, drop_last=False)
+test_loader = make_loader(test_dataset, batch_size=test_size, shuffle=False, device=device, drop_last=False)  # be mindful of the batch size
 
 
 # model
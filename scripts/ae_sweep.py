@@ -1,8 +1,7 @@
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader
 from jepa.trainer.ae_trainer import AutoencoderTrainer
-from jepa.dataset import load_cifar, load_mnist
+from jepa.dataset import load_cifar, load_mnist, make_loader
 from jepa.model.autoencoder import AutoEncoder, AutoencoderCriterion
 from jepa.sam import SAM
 from jepa.utils import set_seed
@@ -17,13 +16,14 @@ def get_dataset(
     dataset="cifar10",
 ):
     root = "../data"
+    device = "cuda" if torch.cuda.is_available() else "cpu"
     load_dataset = load_cifar if dataset == "cifar10" else load_mnist
     train_dataset, train_metadata = load_dataset(train=True, log_to_wandb=False, root=root, jepa=False, shuffle=config.seed, num_samples=config.train_size)
     test_dataset, test_metadata = load_dataset(train=False, log_to_wandb=False, root=root, jepa=False, shuffle=config.seed, num_samples=config.test_size)
     train_metadata["use_as"] = "train"
     test_metadata["use_as"] = "test"
-    train_loader = DataLoader(train_dataset, batch_size=config.batch_size)
-    test_loader = DataLoader(test_dataset, batch_size=config.test_size)  # be mindful of the batch size
+    train_loader = make_loader(train_dataset, batch_size=config.batch_size, shuffle=False, device=device, drop_last=False)
+    test_loader = make_loader(test_dataset, batch_size=config.test_size, shuffle=False, device=device, drop_last=False)  # be mindful of the batch size
     return train_loader, test_loader, train_metadata, test_metadata
 
 
@@ -1,17 +1,24 @@
 import torch
-from torch.nn import functional as F
-from torch.utils.data import Dataset
+from torch.utils.data import DataLoader, Dataset, IterableDataset, get_worker_info, default_collate
 from torchvision import datasets
 from torchvision import transforms
 from typing import Optional
-from copy import deepcopy
 import os
 import json
+import math
+import hashlib
+import tempfile
+from safetensors.torch import save_file, load_file
 from .logger import WandbLogger
 from .utils import set_seed
 from .constants import PROJECT, ENTITY
 
 
+# options for HiddenManifold data generation. nonlinearities are applied in-place.
+FEATURE_GENERATORS = {"gaussian": torch.randn}
+NONLINEARITIES = {"relu": torch.relu_, "tanh": torch.tanh_}
+
+
 # class DatasetWrapper(Dataset):
 #     """
 #     Wrapper class for a torchvision dataset.
@@ -30,13 +37,15 @@ from .constants import PROJECT, ENTITY
     
 #     def __getitem__(self, idx):
 #         x, y = self.dataset[idx]
-#         x_hat = deepcopy(x) if self.jepa else None
+#         x_hat = x.clone() if self.jepa else None
 #         return {"x": x, "y": y, "x_hat": x_hat}
 
 
 class JepaDataset(Dataset):
     """
     Simple dataset class for JEPA.
+    Only spits clean data points: x_hat is produced by corrupting a whole
+    batch at once, after it has been moved to the device (see JepaTrainer).
     """
     def __init__(self, data: torch.Tensor, labels: Optional[torch.Tensor] = None):
         """
@@ -51,22 +60,57 @@ class JepaDataset(Dataset):
     
     def __getitem__(self, idx):
         x = self.data[idx]
-        x_hat = x  # !! this is not a copy, but a reference
         y = self.labels[idx] if self.labels is not None else None
-        return {"x": x, "x_hat": x_hat, "y": y}
+        return {"x": x, "y": y}
+
+
+def _collate_samples(samples: list[dict], compute_dtype: Optional[torch.dtype] = None) -> dict:
+    """
+    Stack samples {"x": ..., "y": ...} into a batch with default_collate, which
+    in worker processes stacks straight into shared memory. Unlike default_collate,
+    accepts unlabelled data: y is then None.
+    :param compute_dtype: if not None, cast the stacked x to this dtype, with a
+    single op per batch.
+    """
+    x = default_collate([sample["x"] for sample in samples])
+    if compute_dtype is not None:
+        x = x.to(compute_dtype)
+    y = default_collate([sample["y"] for sample in samples]) if samples[0]["y"] is not None else None
+    return {"x": x, "y": y}
+
+
+def jepa_collate(samples: list[dict]) -> dict:
+    """
+    Collate function for JepaDataset (see _collate_samples).
+    x_hat is added later, on the device, by JepaTrainer.
+    """
+    return _collate_samples(samples)
 
 
 class SimpleDataset(Dataset):
     """
     Simple dataset class for autoencoders.
     """
-    def __init__(self, data: torch.Tensor, labels: Optional[torch.Tensor] = None):
+    def __init__(
+        self,
+        data: torch.Tensor,
+        labels: Optional[torch.Tensor] = None,
+        storage_dtype: Optional[torch.dtype] = None,
+        compute_dtype: Optional[torch.dtype] = None,
+    ):
         """
         :param data: tensor of data points. Shape [P, ...]
+        :param storage_dtype: if not None, store data in this dtype. E.g. torch.float16
+        halves the memory taken by a dataset that lives on the gpu.
+        :param compute_dtype: if not None, cast batches to this dtype (e.g. back to
+        torch.float32) in collate(). Single data points keep the storage dtype.
         """
         super().__init__()
+        if storage_dtype is not None:
+            data = data.to(storage_dtype).contiguous()
         self.data = data
         self.labels = labels
+        self.compute_dtype = compute_dtype
 
     def __len__(self):
         return len(self.data)
@@ -76,6 +120,135 @@ class SimpleDataset(Dataset):
         y = self.labels[idx] if self.labels is not None else None
         return {"x": x, "y": y}
 
+    def collate(self, samples: list[dict]) -> dict:
+        """
+        Collate function for this dataset: stacks samples and casts the batch to
+        compute_dtype, instead of casting every sample (one kernel each for gpu data).
+        """
+        return _collate_samples(samples, self.compute_dtype)
+
+
+class SimpleBatchedDataset(IterableDataset):
+    """
+    In-memory dataset for autoencoders that yields whole batches at once.
+    Each batch is gathered from a tensor that is already resident in memory
+    with a single indexing op, so there is no per-sample __getitem__ call and
+    no collate step.
+    Use it with DataLoader(dataset, batch_size=None) and num_workers=0: the
+    dataset reshuffles itself at the beginning of every epoch.
+    N.B.: len() is the number of batches, and there is no __getitem__.
+    The number of data points is num_samples.
+    """
+    def __init__(
+        self,
+        data: torch.Tensor,
+        batch_size: int,
+        labels: Optional[torch.Tensor] = None,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        storage_dtype: Optional[torch.dtype] = None,
+        compute_dtype: Optional[torch.dtype] = None,
+    ):
+        """
+        :param data: tensor of data points. Shape [P, ...]
+        :param batch_size: number of data points per batch
+        :param labels: optional tensor of labels. Shape [P]
+        :param shuffle: if True, draw a new permutation of the data every epoch
+        :param drop_last: if True, drop the last batch if it is smaller than batch_size
+        :param storage_dtype: if not None, store data in this dtype (see SimpleDataset)
+        :param compute_dtype: if not None, cast every batch to this dtype
+        """
+        super().__init__()
+        if storage_dtype is not None:
+            data = data.to(storage_dtype).contiguous()
+        self.data = data
+        self.labels = labels
+        self.compute_dtype = compute_dtype
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.num_samples = len(data)
+        if drop_last:
+            self.n_batches = self.num_samples // batch_size
+        else:
+            self.n_batches = math.ceil(self.num_samples / batch_size)
+
+    def __len__(self):
+        return self.n_batches
+
+    def __iter__(self):
+        assert get_worker_info() is None, "batched datasets must be loaded with num_workers=0"
+        B = self.batch_size
+        if self.shuffle:
+            perm = torch.randperm(self.num_samples, device=self.data.device)
+        for i in range(self.n_batches):
+            # gather one batch at a time, never a shuffled copy of the whole dataset
+            idx = perm[i * B:(i + 1) * B] if self.shuffle else slice(i * B, (i + 1) * B)
+            yield self.make_batch(idx)
+
+    def make_batch(self, idx) -> dict:
+        """
+        :param idx: indices of the data points in the batch (a slice or an index tensor)
+        """
+        x = self.data[idx]
+        if self.compute_dtype is not None:
+            x = x.to(self.compute_dtype)
+        y = None
+        if self.labels is not None:
+            y = self.labels[idx.to(self.labels.device) if isinstance(idx, torch.Tensor) else idx]
+        return {"x": x, "y": y}
+
+
+class JepaBatchedDataset(SimpleBatchedDataset):
+    """
+    Same as SimpleBatchedDataset, for jepa training. As for JepaDataset,
+    x_hat is produced on the device by the trainer.
+    """
+
+
+def _atomic_write(path: str, write) -> None:
+    """
+    Call write(tmp_path) on a temporary file next to path, then move it to path.
+    Concurrent readers (e.g. parallel sweep runs sharing a cache) see either
+    the old file or the complete new one, never a partially written one.
+    :param write: function that writes the file at the path it is given
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _resolve_compute_dtype(compute_dtype: Optional[str | torch.dtype], device: str) -> torch.dtype:
+    """
+    Return the torch.dtype to use for the HiddenManifold projection matmul.
+    :param compute_dtype: a floating torch.dtype, its name (e.g. "bfloat16"), or None
+    for the default of device: bfloat16 on cuda, float32 elsewhere.
+    :param device: device used for data generation
+    """
+    if compute_dtype is None:
+        return torch.bfloat16 if torch.device(device).type == "cuda" else torch.float32
+    dtype = getattr(torch, compute_dtype, None) if isinstance(compute_dtype, str) else compute_dtype
+    if not isinstance(dtype, torch.dtype) or not dtype.is_floating_point:
+        raise ValueError(f"compute_dtype must be a floating torch.dtype or its name, got {compute_dtype!r}")
+    return dtype
+
+
+def _load_tensor(path: str) -> torch.Tensor:
+    """
+    Load a tensor saved with torch.save() on cpu, memory-mapping the file
+    when possible, so that pages are read from disk on demand.
+    """
+    try:
+        # requires pytorch >= 2.1 and a file saved with the zipfile serialization
+        return torch.load(path, map_location="cpu", mmap=True)
+    except (TypeError, RuntimeError):
+        return torch.load(path, map_location="cpu")
+
 
 class HiddenManifold:
     """
@@ -90,20 +263,32 @@ class HiddenManifold:
     def __init__(self, save_dir: str = ""):
         self.save_dir = save_dir
         self.config = None
+        # reused across calls to generate_dataset(), to avoid allocator churn
+        self._generator = None
+        self._generator_device = None
+        self._buffers = {}
 
     @staticmethod
     def get_default_config() -> dict:
         """
         Return the default parameters to use for data generation.
         Here is a list of the parameters:
-        - feature_distribution: distribution of the features
-        - nonlinearity: nonlinearity applied after projection matrix
+        - feature_distribution: distribution of the features (see FEATURE_GENERATORS)
+        - nonlinearity: nonlinearity applied after projection matrix (see NONLINEARITIES)
         - D: dimension of the latent space
         - N: dimension of the ambient space
         - P: number of data points to generate
         - p: probability of a pattern being active
         - noise: standard deviation of gaussian noise to add to data
         - device: device to use for data generation (cpu or cuda)
+        - chunk_size: number of data points generated at once. Caps peak memory
+        during generation (the output buffer, plus O(chunk_size * N) scratch)
+        - seed: if not None, random seed set before sampling, for reproducibility
+        - compute_dtype: dtype of the projection matmul, as a torch.dtype or its name
+        (e.g. "bfloat16"). If None, bfloat16 when device is cuda and float32 otherwise.
+        With a lower precision, pre-activations are rounded to that dtype before
+        being upcast; the nonlinearity, the noise and the returned dataset are float32.
+        Float32 matmuls are allowed to use tf32 during generation.
         """
         config = {
             "feature_distribution": "gaussian",
@@ -114,6 +299,9 @@ class HiddenManifold:
             "p": 0.5,
             "noise": 0.0,
             "device": "cuda" if torch.cuda.is_available() else "cpu",
+            "chunk_size": 1024,
+            "seed": None,
+            "compute_dtype": None,
         }
         return config
     
@@ -146,28 +334,111 @@ class HiddenManifold:
         """
         if config is None:
             config = HiddenManifold.get_default_config()
-        self.config = config
-        match config["feature_distribution"]:
-            case "gaussian":
-                feature_generator = torch.randn
-            case _:
-                raise NotImplementedError
-        match config["nonlinearity"]:
-            case "relu":
-                sigma = F.relu
-            case "tanh":
-                sigma = F.tanh
-            case _:
-                raise NotImplementedError
+        compute_dtype = _resolve_compute_dtype(config["compute_dtype"], config["device"])
+        # record the dtype actually used, by name, so that the config stays json serializable
+        self.config = {**config, "compute_dtype": str(compute_dtype).removeprefix("torch.")}
+        try:
+            feature_generator = FEATURE_GENERATORS[config["feature_distribution"]]
+            sigma = NONLINEARITIES[config["nonlinearity"]]
+        except KeyError as e:
+            raise NotImplementedError(f"Unknown option {e}") from e
         D, N, P = config["D"], config["N"], config["P"]
         p, noise, device = config["p"], config["noise"], config["device"]
+        chunk_size = config["chunk_size"]
+        generator = self._get_generator(device, config["seed"])
+        chunk = min(chunk_size, P)
 
-        feature_matrix = feature_generator((D, N))
-        latent_patterns = torch.bernoulli(p * torch.ones((P, D)))
-        data = sigma(torch.matmul(latent_patterns, feature_matrix) / torch.sqrt(torch.tensor(D)))
-        data += noise * torch.randn((P, N))
-        return data.to(device)
+        feature_matrix = self._get_buffer("features", (D, N), torch.float32, device)
+        feature_generator((D, N), generator=generator, out=feature_matrix)
+        feature_matrix.mul_(1.0 / math.sqrt(D))  # fold the scaling once, instead of per chunk
+        if compute_dtype != torch.float32:
+            features = self._get_buffer("features_c", (D, N), compute_dtype, device)
+            feature_matrix = features.copy_(feature_matrix)
+        uniform = self._get_buffer("uniform", (chunk, D), torch.float32, device)
+        latent = self._get_buffer("latent", (chunk, D), compute_dtype, device)
+        if compute_dtype != torch.float32:
+            projection = self._get_buffer("projection", (chunk, N), compute_dtype, device)
+        if noise > 0:
+            gaussian = self._get_buffer("gaussian", (chunk, N), torch.float32, device)
+        # the output is never reused across calls, as callers keep references to it
+        data = torch.empty((P, N), device=device)
+        # allow tf32 tensor cores for the float32 matmul on Ampere+ gpus, restoring
+        # the global setting afterwards, so that model training is not affected
+        matmul_precision = torch.get_float32_matmul_precision()
+        torch.set_float32_matmul_precision("high")
+        try:
+            # generate data points in chunks, so that we never hold more than a
+            # few [chunk_size, *] scratch buffers alongside the output. the matmul
+            # writes straight into the output, and everything after it is in-place.
+            for start in range(0, P, chunk_size):
+                n = min(chunk_size, P - start)
+                torch.rand((n, D), generator=generator, out=uniform[:n])
+                latent_patterns = latent[:n].copy_(uniform[:n] < p)
+                out = data[start:start + n]
+                if compute_dtype == torch.float32:
+                    torch.matmul(latent_patterns, feature_matrix, out=out)
+                else:
+                    out.copy_(torch.matmul(latent_patterns, feature_matrix, out=projection[:n]))
+                sigma(out)
+                if noise > 0:
+                    out.add_(torch.randn((n, N), generator=generator, out=gaussian[:n]), alpha=noise)
+        finally:
+            torch.set_float32_matmul_precision(matmul_precision)
+        return data
+
+    def _get_generator(self, device: str, seed: Optional[int] = None) -> torch.Generator:
+        """
+        Return the random number generator used for data generation on device,
+        creating it the first time. If seed is None, reseed it from the global
+        torch generator, so that set_seed() still makes generation reproducible.
+        """
+        if self._generator is None or self._generator_device != device:
+            self._generator = torch.Generator(device=device)
+            self._generator_device = device
+        if seed is None:
+            seed = int(torch.randint(2**62, (1,)).item())
+        self._generator.manual_seed(seed)
+        return self._generator
+
+    def _get_buffer(self, name: str, shape: tuple, dtype: torch.dtype, device: str) -> torch.Tensor:
+        """
+        Return a scratch buffer for data generation, reusing the one
+        from the previous call if shape, dtype and device match.
+        """
+        key = (tuple(shape), dtype, device)
+        if name not in self._buffers or self._buffers[name][0] != key:
+            self._buffers[name] = (key, torch.empty(shape, dtype=dtype, device=device))
+        return self._buffers[name][1]
     
+    def generate_or_load(self, config: Optional[dict] = None) -> torch.Tensor:
+        """
+        Same as generate_dataset(), but cache the result on disk (as safetensors,
+        like save_dataset()), keyed on the config and the device type. Later calls with
+        the same config load the cached tensor instead of generating it again.
+        Caching requires config["seed"]: without it, the data depends on the
+        global random state, which is not part of the key, so nothing is cached.
+        """
+        if config is None:
+            config = HiddenManifold.get_default_config()
+        if config["seed"] is None:
+            print("config['seed'] is None: generating the dataset without caching it.")
+            return self.generate_dataset(config)
+        # cpu and cuda generators draw different streams from the same seed, so the
+        # device type is part of the key. the index is not, so that identical gpus share a cache
+        key_config = {k: v for k, v in config.items() if k != "device"}
+        key_config["device_type"] = torch.device(config["device"]).type
+        compute_dtype = _resolve_compute_dtype(config["compute_dtype"], config["device"])
+        key_config["compute_dtype"] = str(compute_dtype).removeprefix("torch.")
+        key = hashlib.sha1(json.dumps(key_config, sort_keys=True).encode()).hexdigest()[:12]
+        cache_path = os.path.join(self.save_dir, "_cache", f"hm_{key}.safetensors")
+        if os.path.isfile(cache_path):
+            self.config = {**config, "compute_dtype": key_config["compute_dtype"]}
+            return load_file(cache_path, device="cpu")["data"].to(config["device"])
+        data = self.generate_dataset(config)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        _atomic_write(cache_path, lambda path: save_file({"data": data.contiguous().cpu()}, path))
+        return data
+
     @staticmethod
     def get_dirname(id: str) -> str:
         """
@@ -188,7 +459,8 @@ class HiddenManifold:
             dataset: torch.Tensor,
             id: str,
             exist_ok: bool = False,
-            log_to_wandb: bool = True
+            log_to_wandb: bool = True,
+            save_dtype: torch.dtype = torch.float32,
         ) -> None:
         """
         Save generated dataset to a file. Important for
@@ -199,35 +471,89 @@ class HiddenManifold:
         :param id: unique identifier for the dataset
         :param exist_ok: if False, raise an error if the directory already exists
         :param log_to_wandb: if True, log the dataset to Weights and Biases.
+        :param save_dtype: dtype used to store the dataset on disk. Use torch.bfloat16
+        or torch.float16 to halve the file size. load_dataset() upcasts back to float32.
         """
         dataset_dir = os.path.join(self.save_dir, self.get_dirname(id))
         os.makedirs(dataset_dir, exist_ok=exist_ok)
         print(f"Saving dataset in directory {dataset_dir}")
-        filepath = os.path.join(dataset_dir, f"dataset.pt")
-        torch.save(dataset, filepath)
-        metadata = self.get_config()
+        filepath = os.path.join(dataset_dir, f"dataset.safetensors")
+        to_save = dataset.detach().to(save_dtype).contiguous().cpu()
+        save_file({"data": to_save}, filepath)
+        # build a new dict: self.config must keep its device for later generations
+        metadata = {k: v for k, v in self.config.items() if k != "device"}
+        metadata["save_dtype"] = str(save_dtype).removeprefix("torch.")
         metadata["id"] = id
         metadata["dataset_path"] = filepath
         metadata["dataset_dir"] = dataset_dir
-        del metadata["device"]
         with open(os.path.join(dataset_dir, "metadata.json"), "w") as f:
             json.dump(metadata, f)
         if log_to_wandb:
             WandbLogger.log_dataset(dataset, metadata, project=PROJECT, entity=ENTITY)
 
-    def load_dataset(self, id: str) -> tuple[torch.Tensor, dict]:
+    def load_dataset(self, id: str, pin_memory: bool = False) -> tuple[torch.Tensor, dict]:
         """
         Load a dataset saved with saved_dataset() in memory.
+        Datasets are stored as safetensors, which are memory-mapped and read
+        without any unpickling. Datasets saved as .pt files by older versions
+        are still supported (and memory-mapped when possible).
+        :param pin_memory: if True, return the dataset in pinned memory, for
+        fast (non_blocking) transfers to the gpu.
         """
         dataset_dir = os.path.join(self.save_dir, self.get_dirname(id))
         metadata_path = os.path.join(dataset_dir, "metadata.json")
         with open(metadata_path, "r") as f:
             metadata = json.load(f)
         dataset_path = metadata["dataset_path"]
-        dataset = torch.load(dataset_path)
+        if dataset_path.endswith(".safetensors"):
+            dataset = load_file(dataset_path, device="cpu")["data"]
+        else:
+            dataset = _load_tensor(dataset_path)
+        if metadata.get("save_dtype", "float32") != "float32":
+            dataset = dataset.to(torch.float32)
+        if pin_memory:
+            dataset = dataset.pin_memory()
         return dataset, metadata
 
 
+# identifies dtype and normalization of the tensors cached by load_mnist and
+# load_cifar. Change it whenever the preprocessing changes, to invalidate caches.
+PREPROCESSING_TAG = "float32-pm1"
+
+
+def _get_cache_path(root: str, dataset_id: str) -> str:
+    """
+    Return the path where the preprocessed version of a dataset is cached.
+    """
+    return os.path.join(root, f"{dataset_id}_{PREPROCESSING_TAG}_preproc.pt")
+
+
+def _load_preprocessed(cache_path: str, source_dir: str) -> Optional[tuple[torch.Tensor, torch.Tensor]]:
+    """
+    Load cached (data, targets) if the cache exists and is newer than
+    every file in source_dir. Return None otherwise.
+    """
+    if not os.path.isfile(cache_path) or not os.path.isdir(source_dir):
+        return None
+    source_files = [os.path.join(source_dir, f) for f in os.listdir(source_dir)]
+    source_mtime = max((os.path.getmtime(f) for f in source_files), default=float("inf"))
+    if os.path.getmtime(cache_path) < source_mtime:
+        return None
+    try:
+        cached = torch.load(cache_path, map_location="cpu")
+        return cached["data"], cached["targets"]
+    except Exception as e:  # unreadable cache (e.g. written by an old version): regenerate it
+        print(f"Ignoring unreadable cache {cache_path}: {e}")
+        return None
+
+
+def _save_preprocessed(cache_path: str, data: torch.Tensor, targets: torch.Tensor) -> None:
+    """
+    Cache preprocessed (data, targets), to be read back by _load_preprocessed.
+    """
+    _atomic_write(cache_path, lambda path: torch.save({"data": data.contiguous(), "targets": targets}, path))
+
+
 def load_mnist(
     train: bool = True,
     log_to_wandb: bool = False,
@@ -236,24 +562,34 @@ def load_mnist(
     shuffle: Optional[int] = None,
     jepa: bool = False,
     num_samples: Optional[int] = None,
+    use_cache: bool = True,
 ) -> tuple[Dataset, dict]:
     """
     Load MNIST dataset, flatten digits and scale pixel intensities to [-1, 1].
     Return it as a Dataset, together with metadata.
     :param log_to_wandb: if True, log the dataset to Weights and Biases (before shuffling).
     :param shuffle: seed for shuffling the dataset. If None, don't shuffle.
-    :param jepa: if True, the returned dataset will also spit x_hat for jepa training.
+    :param jepa: if True, return a JepaDataset (x_hat is produced on the device by JepaTrainer).
     :param num_samples: if not None, return only the first num_samples samples after shuffling.
+    :param use_cache: if True, cache the preprocessed tensors in root and reuse them
+    in later calls, skipping decoding and normalization.
     """
-    dataset = datasets.MNIST(
-        root=root,
-        train=train,
-        download=True,
-    )
-    data, targets = dataset.data, dataset.targets
-    data = 2 * (data / 255) - 1
-    data = data.flatten(start_dim=1)
     split = "train" if train else "test"
+    cache_path = _get_cache_path(root, f"mnist-{split}")
+    source_dir = os.path.join(root, "MNIST", "raw")
+    cached = _load_preprocessed(cache_path, source_dir) if use_cache else None
+    if cached is not None:
+        data, targets = cached
+    else:
+        dataset = datasets.MNIST(
+            root=root,
+            train=train,
+            download=True,
+        )
+        data, targets = dataset.data, dataset.targets  # data is a uint8 tensor
+        data = data.reshape(len(data), -1).to(torch.float32).mul_(2.0 / 255.0).sub_(1.0)
+        if use_cache:
+            _save_preprocessed(cache_path, data, targets)
     metadata = {"id": f"mnist-{split}", "shuffle": shuffle, "dataset_dir": "data/MNIST", "num_samples": num_samples}
     if log_to_wandb:
         # TODO: this should also log labels
@@ -283,27 +619,37 @@ def load_cifar(
     shuffle: Optional[int] = None,
     jepa: bool = False,
     num_samples: Optional[int] = None,
+    use_cache: bool = True,
 ) -> tuple[torch.Tensor, dict]:
     """
     Load CIFAR10 or CIFAR100 dataset, flatten images and scale pixel intensities to [-1, 1].
     Return it as a Dataset, together with metadata.
     :param log_to_wandb: if True, log the dataset to Weights and Biases (before shuffling).
     :param shuffle: seed for shuffling the dataset. If None, don't shuffle.
-    :param jepa: if True, the returned dataset will also spit x_hat for jepa training.
+    :param jepa: if True, return a JepaDataset (x_hat is produced on the device by JepaTrainer).
     :param num_samples: if not None, return only the first num_samples samples after shuffling.
+    :param use_cache: if True, cache the preprocessed tensors in root and reuse them
+    in later calls, skipping decoding and normalization.
     """
     cifar = datasets.CIFAR10 if num_classes == 10 else datasets.CIFAR100
-    dataset = cifar(
-        root=root,
-        train=train,
-        download=True,
-    )
-    data, targets = dataset.data, dataset.targets
-    data = torch.tensor(data)  # data is a numpy array
-    targets = torch.tensor(targets)  # targets is a list
-    data = 2 * (data / 255) - 1
-    data = data.flatten(start_dim=1)
     split = "train" if train else "test"
+    cache_path = _get_cache_path(root, f"cifar{num_classes}-{split}")
+    source_dir = os.path.join(root, cifar.base_folder)
+    cached = _load_preprocessed(cache_path, source_dir) if use_cache else None
+    if cached is not None:
+        data, targets = cached
+    else:
+        dataset = cifar(
+            root=root,
+            train=train,
+            download=True,
+        )
+        data, targets = dataset.data, dataset.targets
+        data = torch.from_numpy(data)  # data is a numpy array, no copy
+        targets = torch.tensor(targets)  # targets is a list
+        data = data.reshape(len(data), -1).to(torch.float32).mul_(2.0 / 255.0).sub_(1.0)
+        if use_cache:
+            _save_preprocessed(cache_path, data, targets)
     metadata = {"id": f"cifar{num_classes}-{split}", "dataset_dir": f"data/cifar-{num_classes}-batches-py", "num_samples": num_samples, "shuffle": shuffle}
     if log_to_wandb:
         filepath = os.path.join(metadata["dataset_dir"], metadata["id"])
@@ -324,3 +670,61 @@ def load_cifar(
     dataset_class = JepaDataset if jepa else SimpleDataset
     dataset = dataset_class(data, targets)
     return dataset, metadata
+
+
+def make_loader(
+    dataset: Dataset,
+    batch_size: int,
+    shuffle: bool = True,
+    device: Optional[str] = None,
+    drop_last: bool = True,
+    collate_fn=None,
+) -> DataLoader:
+    """
+    Build a DataLoader with settings that keep the gpu fed: on cuda, a single
+    worker prefetches batches into pinned memory, so that they can be moved to
+    the device with non_blocking=True (see to_device()) while the previous step
+    is running. More workers only add contention for in-memory data.
+    The worker is not persistent: a persistent worker reuses one iterator
+    across calls to iter(), so evaluating on the train loader in the middle of
+    an epoch (e.g. subepoch validation) would reset the epoch being trained on.
+    :param dataset: a Dataset. JepaDataset uses jepa_collate by default, and
+    SimpleDataset its collate() method. For SimpleBatchedDataset and subclasses, batch_size and shuffle are ignored,
+    as the dataset batches and shuffles itself.
+    :param device: device the batches will be moved to. Defaults to cuda if available.
+    :param drop_last: if True, drop the last batch if it is smaller than batch_size.
+    """
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    data = getattr(dataset, "data", None)
+    # data living on the gpu can be neither pinned nor shared with workers
+    use_cuda = device.startswith("cuda") and (data is None or data.device.type == "cpu")
+    if isinstance(dataset, SimpleBatchedDataset):
+        return DataLoader(dataset, batch_size=None, pin_memory=use_cuda)
+    if collate_fn is None and isinstance(dataset, JepaDataset):
+        collate_fn = jepa_collate
+    elif collate_fn is None and isinstance(dataset, SimpleDataset):
+        collate_fn = dataset.collate
+    num_workers = 1 if use_cuda else 0
+    worker_kwargs = {"prefetch_factor": 4} if num_workers > 0 else {}
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=use_cuda,
+        drop_last=drop_last,
+        collate_fn=collate_fn,
+        **worker_kwargs,
+    )
+
+
+def to_device(batch, device: str) -> dict:
+    """
+    Move all tensors in a batch to device, without blocking the host.
+    Returns a new dict; non-tensor values are left untouched.
+    """
+    return {
+        key: value.to(device, non_blocking=True) if isinstance(value, torch.Tensor) else value
+        for key, value in batch.items()
+    }
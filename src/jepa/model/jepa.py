@@ -5,7 +5,7 @@ from copy import deepcopy
 import os
 import json
 from ..utils import sequential_from_string, set_seed
-from ..evaluation import norm_of_parameters
+from ..evaluation import norm_of_parameters, EvalAE
 
 
 class Jepa(nn.Module):
@@ -158,3 +158,35 @@ class JepaCriterion(nn.Module):
             "reconstruction_error": type(self.re).__name__,
             "sparsity_weight": self.sparsity_weight
         }
+
+
+class CorruptionModule(nn.Module):
+    def __init__(
+            self,
+            noise_type: str = "identity",
+            noise_strength: float = 0.0,
+        ):
+        """
+        Corrupt a whole batch of data points at once, to produce the
+        inputs x_hat of the EMA encoder. Meant to run on the device, after
+        the batch has been transferred, rather than per sample in the DataLoader.
+        :param noise_type: any noise type supported by EvalAE.corrupt_data
+        :param noise_strength: strength of the noise
+        """
+        super().__init__()
+        self.noise_type = noise_type
+        self.noise_strength = noise_strength
+
+    @torch.no_grad()
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        :param x: batch of data points. Shape [B, ...]
+        :return: corrupted batch, same shape as x. With noise_type="identity", x itself.
+        """
+        return EvalAE.corrupt_data(x, self.noise_strength, noise_type=self.noise_type)
+
+    def get_config(self) -> dict:
+        return {
+            "noise_type": self.noise_type,
+            "noise_strength": self.noise_strength,
+        }
@@ -7,6 +7,7 @@ import pandas as pd
 from typing import Optional, Union
 from .trainer import Trainer
 from ..model.autoencoder import AutoEncoder
+from ..dataset import SimpleBatchedDataset
 from ..evaluation import (
     EvalAE,
     norm_of_parameters,
@@ -53,7 +54,9 @@ class AutoencoderTrainer(Trainer):
                 self.test_loader is not None
             ), "If train_set_percentage_for_flatness is 'auto', test_loader must be provided."
             train_set_percentage_for_flatness = min(
-                len(self.test_loader.dataset) / len(self.train_loader.dataset), 1.0
+                self.get_dataset_size(self.test_loader)
+                / self.get_dataset_size(self.train_loader),
+                1.0,
             )
         self.flatness_interval = flatness_interval
         self.train_set_percentage_for_flatness = train_set_percentage_for_flatness
@@ -180,10 +183,10 @@ class AutoencoderTrainer(Trainer):
             self.model.encoder, self.test_loader, self.device
         )
         train_dl = DataLoader(
-            train_latents, batch_size=self.train_loader.batch_size, shuffle=True
+            train_latents, batch_size=self.get_batch_size(self.train_loader), shuffle=True
         )
         test_dl = DataLoader(
-            test_latents, batch_size=self.test_loader.batch_size, shuffle=False
+            test_latents, batch_size=self.get_batch_size(self.test_loader), shuffle=False
         )
         return train_dl, test_dl
 
@@ -255,7 +258,8 @@ class AutoencoderTrainer(Trainer):
         :param split: "val" or "train"
         :param n_images: number of distinct images to try
         """
-        ds = self.test_loader.dataset if split == "val" else self.train_loader.dataset
+        loader = self.test_loader if split == "val" else self.train_loader
+        ds = loader.dataset
         strengths = [0.0, 0.0, 0.5, 1.0, 0.25, 0.5, 0.25, 0.5]
         types = [
             "identity",
@@ -269,11 +273,15 @@ class AutoencoderTrainer(Trainer):
         ]
         images = []
         for _ in range(n_images):
-            idx = random.randint(0, len(ds) - 1)
+            idx = random.randint(0, self.get_dataset_size(loader) - 1)
             for strength, noise_type in zip(strengths, types):
-                batch = ds[idx]
-                batch["x"] = batch["x"].to(self.device)
-                noisy = EvalAE.corrupt_data(batch["x"], strength, noise_type=noise_type)
+                if isinstance(ds, SimpleBatchedDataset):  # no per-sample access
+                    x = ds.data[idx].to(self.device)
+                else:
+                    x = ds[idx]["x"].to(self.device)
+                if getattr(ds, "compute_dtype", None) is not None:  # data points keep the storage dtype
+                    x = x.to(ds.compute_dtype)
+                noisy = EvalAE.corrupt_data(x, strength, noise_type=noise_type)
                 x_hat = self.model({"x": noisy})["x_hat"]
                 noisy = self.reassemble_image(noisy)
                 x_hat = self.reassemble_image(x_hat)
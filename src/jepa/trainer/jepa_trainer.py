@@ -4,7 +4,7 @@ from torch.utils.data import DataLoader
 import matplotlib.pyplot as plt
 from typing import Optional
 from .trainer import Trainer
-from ..model.jepa import Jepa
+from ..model.jepa import Jepa, CorruptionModule
 from ..evaluation import build_dataset_of_latents, train_classifier
 
 
@@ -14,13 +14,26 @@ class JepaTrainer(Trainer):
         alpha: float = 0.99,
         classification_interval: Optional[int] = None,
         classification_epochs: int = 3,
+        corruption: Optional[nn.Module] = None,
         **kwargs
     ):
+        """
+        :param corruption: module mapping a batch x to the input x_hat of the EMA
+        encoder. Applied on the device, after each batch is moved there.
+        Defaults to the identity (x_hat = x).
+        """
         super().__init__(**kwargs)
         assert isinstance(self.model, Jepa), "JepaTrainer expects a Jepa model."
+        if corruption is None:
+            corruption = CorruptionModule()
         self.alpha = alpha
         self.classification_interval = classification_interval
         self.classification_epochs = classification_epochs
+        self.corruption = corruption.to(self.device)
+
+    def move_to_device(self, batch: dict):
+        super().move_to_device(batch)
+        batch["x_hat"] = self.corruption(batch["x"])
 
     def train_step(self, batch: dict) -> dict:
         loss = super().train_step(batch)
@@ -33,6 +46,15 @@ class JepaTrainer(Trainer):
             self.handle_classification()
         return loss
 
+    def get_training_hyperparameters(self) -> dict:
+        hyperparams = super().get_training_hyperparameters()
+        hyperparams["corruption"] = (
+            self.corruption.get_config()
+            if hasattr(self.corruption, "get_config")
+            else type(self.corruption).__name__
+        )
+        return hyperparams
+
     def log_on_train_step(self, losses):
         super().log_on_train_step(losses)
         if self.step % (self.log_interval * 20) == 0:
@@ -121,10 +143,10 @@ class JepaTrainer(Trainer):
             self.model.encoder, self.test_loader, self.device
         )
         train_dl = DataLoader(
-            train_latents, batch_size=self.train_loader.batch_size, shuffle=True
+            train_latents, batch_size=self.get_batch_size(self.train_loader), shuffle=True
         )
         test_dl = DataLoader(
-            test_latents, batch_size=self.test_loader.batch_size, shuffle=False
+            test_latents, batch_size=self.get_batch_size(self.test_loader), shuffle=False
         )
         return train_dl, test_dl
 
@@ -151,9 +151,7 @@ class Trainer:
             raise NotImplementedError(
                 "Gradient accumulation not implemented for SAM yet."
             )
-        for key in batch:
-            if isinstance(batch[key], torch.Tensor):
-                batch[key] = batch[key].to(self.device)
+        self.move_to_device(batch)
         # first forward-backward pass; use original weights w.
         output = self.model(batch)
         losses = self.criterion(output, batch)
@@ -181,17 +179,18 @@ class Trainer:
             self.logger.add_metric(value.item(), f"train/{key}", self.step)
 
     def move_to_device(self, batch: dict):
+        # non_blocking only overlaps with compute for pinned batches (see make_loader)
         for key in batch:
             if isinstance(batch[key], torch.Tensor):
-                batch[key] = batch[key].to(self.device)
+                batch[key] = batch[key].to(self.device, non_blocking=True)
             elif isinstance(batch[key], dict):
                 for k in batch[key]:
                     if isinstance(batch[key][k], torch.Tensor):
-                        batch[key][k] = batch[key][k].to(self.device)
+                        batch[key][k] = batch[key][k].to(self.device, non_blocking=True)
             elif isinstance(batch[key], list):
                 for i, item in enumerate(batch[key]):
                     if isinstance(item, torch.Tensor):
-                        batch[key][i] = item.to(self.device)
+                        batch[key][i] = item.to(self.device, non_blocking=True)
 
     def train_epoch(self) -> float:
         self.model.train()
@@ -345,7 +344,7 @@ class Trainer:
                 if isinstance(self.optimizer, SAM)
                 else None
             ),
-            "batch_size": self.train_loader.batch_size,
+            "batch_size": self.get_batch_size(self.train_loader),
             "max_epochs": self.max_epochs,
             "weight_decay": self.optimizer.param_groups[0]["weight_decay"],
             "optimizer": type(self.optimizer).__name__,
@@ -355,14 +354,32 @@ class Trainer:
                 else None
             ),
             "scheduler": type(self.scheduler).__name__ if self.scheduler else None,
-            "train_size": len(self.train_loader.dataset),
-            "test_size": len(self.test_loader.dataset) if self.test_loader else None,
+            "train_size": self.get_dataset_size(self.train_loader),
+            "test_size": self.get_dataset_size(self.test_loader) if self.test_loader else None,
             "target_loss": self.target_loss,
             "seed": self.seed,
             "compile_model": self.compile_model,
         }
         return hyperparameters
 
+    @staticmethod
+    def get_batch_size(loader: DataLoader) -> int:
+        """
+        Return the batch size of a DataLoader. Datasets that yield whole batches
+        (e.g. SimpleBatchedDataset) are loaded with batch_size=None, and carry
+        the batch size themselves.
+        """
+        if loader.batch_size is not None:
+            return loader.batch_size
+        return loader.dataset.batch_size
+
+    @staticmethod
+    def get_dataset_size(loader: DataLoader) -> int:
+        """
+        Return the number of data points in the dataset of a DataLoader.
+        """
+        return getattr(loader.dataset, "num_samples", len(loader.dataset))
+
     def get_optimizer_hyperparameters(self):
         """
         Return a dictionary with the hyperparameters used for the optimizer.